@@ -1,6 +1,7 @@
 from __future__ import annotations
 import argparse
 import configparser
+import functools
 import os
 import re
 import shutil
@@ -8,15 +9,39 @@ import subprocess
 import sys
 import tempfile
 import traceback
-from typing import List, Set, Dict, Tuple
-from urllib.parse import urlparse
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
 SEMVER_RE = re.compile(
-    r"^(?:0|[1-9]\d*)\.(?:0|[1-9]\d*)\.(?:0|[1-9]\d*)(?:-[0-9A-Za-z-.]+)?(?:\+[0-9A-Za-z-.]+)?$"
+    r"(?:0|[1-9][0-9]*)(?:\.(?:0|[1-9][0-9]*)){2}(?:-[0-9A-Za-z.-]+)?(?:\+[0-9A-Za-z.-]+)?"
 )
 PACKAGE_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
-VALID_OUTPUT_EXTS = {".png", ".svg", ".svgz"}
-REPO_MODES = {"auto", "local", "git", "http"}
+_match_pkg = PACKAGE_NAME_RE.match
+_match_semver = SEMVER_RE.fullmatch
+VALID_OUTPUT_EXTS = frozenset({".png", ".svg", ".svgz"})
+REPO_MODES = frozenset(sys.intern(m) for m in ("auto", "local", "git", "http"))
+_VALID_EXTS_TUPLE = tuple(VALID_OUTPUT_EXTS)
+_VALID_EXTS_HELP = ", ".join(sorted(VALID_OUTPUT_EXTS))
+_REPO_MODES_HELP = ", ".join(sorted(REPO_MODES))
+_REPO_MODE_ERR = f"repo-mode must be one of: {_REPO_MODES_HELP}"
+_REPO_MODE_NORMALIZE = {m: m for m in REPO_MODES}
+_URL_SCHEMES = frozenset({"http", "https", "git", "ssh"})
+
+_VERSPEC_SPLIT = re.compile(r"[<>=!~]")
+_VERSPEC_CHARS = frozenset("<>=!~")
+_QUOTED = re.compile(r"['\"]([^'\"]+)['\"]")
+_INSTALL_REQUIRES_START = re.compile(r"install_requires\s*=\s*\[")
+_INSTALL_REQUIRES = re.compile(r"install_requires\s*=\s*\[(.*?)\]", re.S)
+_REQUIREMENTS = re.compile(r"requirements\s*=\s*\[(.*?)\]", re.S)
+_SPLIT_WS_COMMA = re.compile(r"[,\s]+")
+_SSH_REPO = re.compile(r"[\w.+-]+@[\w.-]+:")
+_SP_KW = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "check": True}
+if sys.platform == "win32":
+    _SP_KW["creationflags"] = subprocess.CREATE_NO_WINDOW
+_PRUNE_DIRS = frozenset({
+    ".git", "node_modules", "venv", ".venv", "__pycache__",
+    ".tox", "build", "dist", ".mypy_cache", ".pytest_cache",
+})
 
 
 def error(msg: str) -> None:
@@ -27,37 +52,35 @@ def error(msg: str) -> None:
 def validate_package_name(value: str) -> str:
     if not value:
         raise argparse.ArgumentTypeError("package name must not be empty")
-    if not PACKAGE_NAME_RE.match(value):
+    if not _match_pkg(value):
         raise argparse.ArgumentTypeError("package name contains invalid characters")
     return value
 
 
 def validate_repo(value: str) -> str:
-    if value.startswith("git@") or re.match(r"^[\w.+-]+@[\w.-]+:", value):
+    if is_remote_repo_like(value):
+        parsed = _urlparse_cached(value)
+        if parsed.scheme in _URL_SCHEMES and not parsed.netloc:
+            raise argparse.ArgumentTypeError("repo URL looks invalid: %s" % value)
         return value
-    parsed = urlparse(value)
-    if parsed.scheme in ("http", "https", "git", "ssh"):
-        if not parsed.netloc:
-            raise argparse.ArgumentTypeError(f"repo URL looks invalid: {value}")
-        return value
-    if os.path.exists(value):
-        return os.path.abspath(value)
-    raise argparse.ArgumentTypeError(f"repo path does not exist: {value}")
+    try:
+        os.stat(value)
+    except OSError:
+        raise argparse.ArgumentTypeError("repo path does not exist: %s" % value)
+    return os.path.abspath(value)
 
 
 def validate_repo_mode(value: str) -> str:
-    v = value.lower()
-    if v not in REPO_MODES:
-        raise argparse.ArgumentTypeError(
-            f"repo-mode must be one of: {', '.join(sorted(REPO_MODES))}"
-        )
-    return v
+    norm = _REPO_MODE_NORMALIZE.get(sys.intern(value.lower()))
+    if norm is None:
+        raise argparse.ArgumentTypeError(_REPO_MODE_ERR)
+    return norm
 
 
 def validate_version(value: str) -> str:
     if value == "latest":
         return value
-    if SEMVER_RE.match(value):
+    if _match_semver(value):
         return value
     raise argparse.ArgumentTypeError(
         "version must be 'latest' or follow semantic versioning (e.g. 1.2.3)"
@@ -65,42 +88,28 @@ def validate_version(value: str) -> str:
 
 
 def validate_output(value: str) -> str:
-    root, ext = os.path.splitext(value)
-    if ext == "":
+    # ведущие точки не считаются расширением, как в os.path.splitext (".svg" — без расширения)
+    head, sep, tail = os.path.basename(value).lstrip(".").rpartition(".")
+    if not sep:
         raise argparse.ArgumentTypeError(
             "output file must have an extension like .png or .svg"
         )
-    if ext.lower() not in VALID_OUTPUT_EXTS:
+    if not value.lower().endswith(_VALID_EXTS_TUPLE):
         raise argparse.ArgumentTypeError(
-            f"unsupported output extension '{ext}'; supported: {', '.join(sorted(VALID_OUTPUT_EXTS))}"
+            "unsupported output extension '.%s'; supported: %s" % (tail, _VALID_EXTS_HELP)
         )
     dirpath = os.path.dirname(value) or "."
-    if not os.path.isdir(dirpath):
-        raise argparse.ArgumentTypeError(f"output directory does not exist: {dirpath}")
-    test_path = os.path.join(dirpath, f".depviz_tmp_write_test_{os.getpid()}")
-    try:
-        with open(test_path, "w") as f:
-            f.write("x")
-        os.remove(test_path)
-    except Exception as e:
-        raise argparse.ArgumentTypeError(f"no write permission in output directory '{dirpath}': {e}")
+    if not os.access(dirpath, os.W_OK | os.X_OK):
+        if not os.path.isdir(dirpath):
+            raise argparse.ArgumentTypeError("output directory does not exist: %s" % dirpath)
+        raise argparse.ArgumentTypeError("no write permission in output directory '%s'" % dirpath)
     return os.path.abspath(value)
 
 
-def validate_filter(value: str) -> str:
-    if value is None:
-        return ""
-    return value
-
-
+@functools.lru_cache(maxsize=1)
 def has_git() -> bool:
     try:
-        subprocess.run(
-            ["git", "--version"],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True,
-        )
+        subprocess.run(["git", "--version"], **_SP_KW)
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
@@ -111,68 +120,97 @@ def clone_repo(repo: str, dest: str, version: str | None = None) -> None:
         raise RuntimeError("Git is not installed or not found in PATH; cannot clone repository")
     cmd = ["git", "clone", "--depth", "1", repo, dest]
     try:
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        subprocess.run(cmd, **_SP_KW)
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Failed to clone repository '{repo}': {e}")
     if version and version != "latest":
         try:
-            subprocess.run(["git", "checkout", version], cwd=dest, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            subprocess.run(["git", "checkout", version], cwd=dest, **_SP_KW)
         except subprocess.CalledProcessError:
             try:
-                subprocess.run(["git", "fetch", "--tags"], cwd=dest, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                subprocess.run(["git", "checkout", version], cwd=dest, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                subprocess.run(["git", "fetch", "--tags"], cwd=dest, **_SP_KW)
+                subprocess.run(["git", "checkout", version], cwd=dest, **_SP_KW)
             except subprocess.CalledProcessError as e:
                 raise RuntimeError(f"Failed to checkout version '{version}' in repository '{repo}': {e}")
 
 
+@functools.lru_cache(maxsize=32)
+def _urlparse_cached(value: str):
+    from urllib.parse import urlparse
+
+    return urlparse(value)
+
+
 def is_remote_repo_like(repo: str) -> bool:
-    if repo.startswith("git@") or re.match(r"^[\w.+-]+@[\w.-]+:", repo):
+    if repo.startswith("git@") or _SSH_REPO.match(repo) is not None:
         return True
-    parsed = urlparse(repo)
-    return parsed.scheme in ("http", "https", "git", "ssh")
+    if ":" not in repo:
+        return False
+    return _urlparse_cached(repo).scheme in _URL_SCHEMES
+
+
+def _fast_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _copy_repo(src_root: str, dst_root: str) -> None:
+    # объекты git неизменяемы, их можно разделять жёсткими ссылками; остальное в .git
+    # (HEAD, index, refs, logs, config) git меняет на месте — это копируем
+    git_dir = os.path.join(src_root, ".git") + os.sep
+    objects_dir = git_dir + "objects" + os.sep
+
+    def copy(src: str, dst: str) -> None:
+        if src.startswith(git_dir) and not src.startswith(objects_dir):
+            shutil.copy2(src, dst)
+        else:
+            _fast_copy(src, dst)
+
+    shutil.copytree(src_root, dst_root, copy_function=copy, dirs_exist_ok=True)
 
 
 def prepare_repo(repo: str, repo_mode: str, version: str) -> str:
+    remote = is_remote_repo_like(repo)
+    if not remote:
+        abs_path = os.path.abspath(repo)
+        if not os.path.isdir(abs_path):
+            raise RuntimeError(f"Local repository path is not a directory: {abs_path}")
+        # без checkout локальный репозиторий читается на месте, копия не нужна
+        if not (version and version != "latest" and os.path.isdir(os.path.join(abs_path, ".git"))):
+            return abs_path
     tmpdir = tempfile.mkdtemp(prefix="depviz_repo_")
     try:
-        if is_remote_repo_like(repo):
+        if remote:
             clone_repo(repo, tmpdir, version)
             return tmpdir
-        else:
-            abs_path = os.path.abspath(repo)
-            if not os.path.isdir(abs_path):
-                raise RuntimeError(f"Local repository path is not a directory: {abs_path}")
-            shutil.copytree(abs_path, tmpdir, dirs_exist_ok=True)
-            git_dir = os.path.join(tmpdir, ".git")
-            if os.path.isdir(git_dir) and version and version != "latest":
-                try:
-                    subprocess.run(["git", "checkout", version], cwd=tmpdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-                except subprocess.CalledProcessError:
-                    pass
-            return tmpdir
+        _copy_repo(abs_path, tmpdir)
+        try:
+            subprocess.run(["git", "checkout", version], cwd=tmpdir, **_SP_KW)
+        except subprocess.CalledProcessError:
+            pass
+        return tmpdir
     except Exception:
         shutil.rmtree(tmpdir, ignore_errors=True)
         raise
 
 
 def parse_requirements_file(req_file_path: str) -> Set[str]:
-    dependencies: Set[str] = set()
     if not os.path.isfile(req_file_path):
-        return dependencies
-    with open(req_file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            pkg_name = re.split(r"[<>=!~]", line)[0].strip()
-            if pkg_name:
-                dependencies.add(pkg_name)
-    return dependencies
+        return set()
+    with open(req_file_path, "rb") as f:
+        data = f.read().decode("utf-8")
+    return {
+        name
+        for raw in data.splitlines()
+        if (line := raw.strip()) and not line.startswith("#") and (name := normalize_dep_name(line))
+    }
 
 
 def parse_setup_cfg(path: str) -> Set[str]:
     deps: Set[str] = set()
-    cfg = configparser.ConfigParser()
+    cfg = configparser.ConfigParser(interpolation=None, strict=False)
     cfg.read(path, encoding="utf-8")
     if cfg.has_section("options") and cfg.has_option("options", "install_requires"):
         raw = cfg.get("options", "install_requires")
@@ -180,61 +218,110 @@ def parse_setup_cfg(path: str) -> Set[str]:
             line = line.strip()
             if not line or line.startswith("#"):
                 continue
-            pkg = re.split(r"[<>=!~]", line)[0].strip()
+            pkg = _VERSPEC_SPLIT.split(line, 1)[0].strip()
             if pkg:
                 deps.add(pkg)
     return deps
 
 
 def parse_pyproject_toml(path: str) -> Set[str]:
-    text = open(path, "r", encoding="utf-8").read()
-    m = re.search(r"(?ms)^\s*\[project\].*?^dependencies\s*=\s*\[(.*?)\]", text)
-    if m:
-        inner = m.group(1)
-        items = re.findall(r"['\"]([^'\"]+)['\"]", inner)
-        return set(items)
-    m2 = re.search(r"(?ms)^\s*\[tool\.poetry\].*?^dependencies\s*=\s*\{(.*?)\}", text)
-    if m2:
-        block = m2.group(1)
-        deps = []
-        for line in block.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            parts = line.split("=", 1)
-            pkg_name = parts[0].strip().strip('"').strip("'")
-            if pkg_name.lower() != "python":
-                deps.append(pkg_name)
-        return set(deps)
-    m3 = re.search(r"(?ms)^\s*\[tool\.flit\.metadata\].*?^requires\s*=\s*\[(.*?)\]", text)
-    if m3:
-        items = re.findall(r"['\"]([^'\"]+)['\"]", m3.group(1))
-        return set(items)
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            # без TOML-парсера (Python < 3.11 без tomli) pyproject.toml пропускается
+            return set()
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except tomllib.TOMLDecodeError:
+        return set()
+    tool = data.get("tool", {})
+    items = data.get("project", {}).get("dependencies")
+    if items:
+        return {normalize_dep_name(d) for d in items}
+    poetry = tool.get("poetry", {}).get("dependencies")
+    if poetry:
+        return {normalize_dep_name(d) for d in poetry if d.lower() != "python"}
+    items = tool.get("flit", {}).get("metadata", {}).get("requires")
+    if items:
+        return {normalize_dep_name(d) for d in items}
     return set()
 
 
 def parse_setup_py(path: str) -> Set[str]:
-    text = open(path, "r", encoding="utf-8").read()
-    m = re.search(r"install_requires\s*=\s*\[(.*?)\]", text, flags=re.S)
+    current: List[str] = []
+    in_list = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not in_list:
+                m = _INSTALL_REQUIRES_START.search(line)
+                if not m:
+                    continue
+                in_list = True
+                line = line[m.end():]
+            head, sep, _ = line.partition("]")
+            current.append(head)
+            if sep:
+                break
+    if current:
+        items = _QUOTED.findall("".join(current))
+        if items:
+            return set(items)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    m = _INSTALL_REQUIRES.search(text)
     if m:
         inner = m.group(1)
-        items = re.findall(r"['\"]([^'\"]+)['\"]", inner)
+        items = _QUOTED.findall(inner)
         return set(items)
-    m2 = re.search(r"requirements\s*=\s*\[(.*?)\]", text, flags=re.S)
+    m2 = _REQUIREMENTS.search(text)
     if m2:
         inner = m2.group(1)
-        items = re.findall(r"['\"]([^'\"]+)['\"]", inner)
+        items = _QUOTED.findall(inner)
         return set(items)
     return set()
 
 
 def normalize_dep_name(dep: str) -> str:
     dep = dep.strip().strip('"').strip("'")
-    dep = dep.split("[")[0]
-    dep = re.split(r"[<>=!~]", dep)[0]
+    i = dep.find("[")
+    if i >= 0:
+        dep = dep[:i]
+    for i, c in enumerate(dep):
+        if c in _VERSPEC_CHARS:
+            dep = dep[:i]
+            break
     return dep.strip()
 
 
+_DEP_FILE_PARSERS = {
+    "requirements.txt": parse_requirements_file,
+    "setup.cfg": parse_setup_cfg,
+    "setup.py": parse_setup_py,
+    "pyproject.toml": parse_pyproject_toml,
+}
+
+
+def _scan_for_dep_files(root: str) -> Iterator[str]:
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in _PRUNE_DIRS:
+                        stack.append(e.path)
+                elif e.is_file() and e.name.lower() in _DEP_FILE_PARSERS:
+                    yield e.path
+
+
 def collect_direct_dependencies(repo_path: str) -> Set[str]:
     candidates = [
         os.path.join(repo_path, "pyproject.toml"),
@@ -257,18 +344,15 @@ def collect_direct_dependencies(repo_path: str) -> Set[str]:
         found_any = True
         deps.extend(parse_requirements_file(candidates[3]))
     if not found_any:
-        for root, dirs, files in os.walk(repo_path):
-            for fname in files:
-                fname_l = fname.lower()
-                file_path = os.path.join(root, fname)
-                if fname_l == "requirements.txt":
-                    deps.extend(parse_requirements_file(file_path))
-                elif fname_l == "setup.cfg":
-                    deps.extend(parse_setup_cfg(file_path))
-                elif fname_l == "setup.py":
-                    deps.extend(parse_setup_py(file_path))
-                elif fname_l == "pyproject.toml":
-                    deps.extend(parse_pyproject_toml(file_path))
+        first_dir = None
+        for file_path in _scan_for_dep_files(repo_path):
+            parent = os.path.dirname(file_path)
+            if first_dir is None:
+                first_dir = parent
+            elif parent != first_dir:
+                break
+            parser = _DEP_FILE_PARSERS[os.path.basename(file_path).lower()]
+            deps.extend(parser(file_path))
     normalized_deps = {normalize_dep_name(d) for d in deps if normalize_dep_name(d)}
     normalized_deps.discard("")
     return normalized_deps
@@ -285,173 +369,167 @@ def load_test_graph(path: str) -> Dict[str, Set[str]]:
             if ':' in line:
                 left, right = line.split(":", 1)
                 node = left.strip()
-                deps = [p.strip() for p in re.split(r"[,\s]+", right.strip()) if p.strip()]
+                deps = [p.strip() for p in _SPLIT_WS_COMMA.split(right.strip()) if p.strip()]
                 graph[node] = set(deps)
             elif "->" in line:
                 left, right = line.split("->", 1)
                 node = left.strip()
-                deps = [p.strip() for p in re.split(r"[,\s]+", right.strip()) if p.strip()]
+                deps = [p.strip() for p in _SPLIT_WS_COMMA.split(right.strip()) if p.strip()]
                 graph[node] = set(deps)
             else:
                 node = line.strip()
                 graph[node] = set()
     return graph
 
-def build_graph_from_test(start: str, graph: Dict[str, Set[str]], ignore_substr: str) -> Tuple[Set[str], Set[Tuple[str, str]], List[List[str]]]:
+def filter_graph(graph: Dict[str, Set[str]], ignore_substr: str) -> Dict[str, Set[str]]:
+    if not ignore_substr:
+        return graph
+    return {u: {v for v in vs if ignore_substr not in v} for u, vs in graph.items() if ignore_substr not in u}
+
+def _walk_graph(start: str, graph: Dict[str, Set[str]], ignore_substr: str) -> Tuple[Set[str], List[Tuple[str, str]], List[List[str]]]:
+    # graph должен быть уже отфильтрован через filter_graph; ignore_substr проверяется только для start
     visited: Set[str] = set()
-    onstack: Set[str] = set()
-    edges: Set[Tuple[str, str]] = set()
+    edges: List[Tuple[str, str]] = []
     cycles: List[List[str]] = []
-    path_stack: List[str] = []
-
-    def dfs(u: str):
-        if ignore_substr and ignore_substr in u:
-            return
-        if u in path_stack:  # если уже в текущем пути — цикл
-            idx = path_stack.index(u)
-            cycles.append(path_stack[idx:] + [u])
-            return
-        if u in visited:
-            return
-        visited.add(u)
-        path_stack.append(u)
-        for v in sorted(graph.get(u, set())):
-            if ignore_substr and ignore_substr in v:
+    if ignore_substr and ignore_substr in start:
+        return visited, edges, cycles
+    sorted_adj: Dict[str, List[str]] = {u: sorted(vs) for u, vs in graph.items()}
+    visited.add(start)
+    path_stack: List[str] = [start]
+    path_index: Dict[str, int] = {start: 0}
+    stack = [(start, iter(sorted_adj.get(start, ())))]
+    while stack:
+        u, children = stack[-1]
+        for v in children:
+            edges.append((u, v))
+            idx = path_index.get(v)
+            if idx is not None:  # если уже в текущем пути — цикл
+                cycles.append(path_stack[idx:] + [v])
                 continue
-            edges.add((u, v))
-            dfs(v)
-        path_stack.pop()
-    dfs(start)
+            if v in visited:
+                continue
+            visited.add(v)
+            path_index[v] = len(path_stack)
+            path_stack.append(v)
+            stack.append((v, iter(sorted_adj.get(v, ()))))
+            break
+        else:
+            stack.pop()
+            del path_index[path_stack.pop()]
     return visited, edges, cycles
 
-def build_graph_from_repo(start: str, direct_deps: Set[str], repo_path: str, ignore_substr: str) -> Tuple[Set[str], Set[Tuple[str, str]], List[List[str]]]:
-    graph: Dict[str, Set[str]] = {start: set(d for d in direct_deps if not (ignore_substr and ignore_substr in d))}
-    visited: Set[str] = set()
-    onstack: Set[str] = set()
-    edges: Set[Tuple[str, str]] = set()
-    cycles: List[List[str]] = []
-    path_stack: List[str] = []
-
-    def dfs(u: str):
-        if ignore_substr and ignore_substr in u:
-            return
-        if u in path_stack:  # если уже в текущем пути — цикл
-            idx = path_stack.index(u)
-            cycles.append(path_stack[idx:] + [u])
-            return
-        if u in visited:
-            return
-        visited.add(u)
-        path_stack.append(u)
-        for v in sorted(graph.get(u, set())):
-            if ignore_substr and ignore_substr in v:
-                continue
-            edges.add((u, v))
-            dfs(v)
-        path_stack.pop()
+def build_graph_from_test(start: str, graph: Dict[str, Set[str]], ignore_substr: str) -> Tuple[Set[str], List[Tuple[str, str]], List[List[str]]]:
+    # graph ожидается уже отфильтрованным через filter_graph (так его передаёт main)
+    return _walk_graph(start, graph, ignore_substr)
 
-    dfs(start)
-    return visited, edges, cycles
+def build_graph_from_repo(start: str, direct_deps: Set[str], repo_path: str, ignore_substr: str) -> Tuple[Set[str], List[Tuple[str, str]], List[List[str]]]:
+    graph: Dict[str, Set[str]] = {start: {d for d in direct_deps if not (ignore_substr and ignore_substr in d)}}
+    return _walk_graph(start, graph, ignore_substr)
 
-def print_graph_result(start: str, nodes: Set[str], edges: Set[Tuple[str, str]], cycles: List[List[str]], ignore_substr: str):
-    print(f"Dependency graph starting from '{start}':")
+def print_graph_result(start: str, nodes: Set[str], edges: List[Tuple[str, str]], cycles: List[List[str]], ignore_substr: str):
+    out = [f"Dependency graph starting from '{start}':"]
     if ignore_substr:
-        print(f"(ignoring packages containing substring '{ignore_substr}')")
-    print(f"Total nodes: {len(nodes)}")
-    for node in sorted(nodes):
-        print(f" - {node}")
-    print(f"Total edges: {len(edges)}")
-    for src, dst in sorted(edges):
-        print(f" {src} -> {dst}")
+        out.append(f"(ignoring packages containing substring '{ignore_substr}')")
+    out.append(f"Total nodes: {len(nodes)}")
+    out.extend(f" - {node}" for node in sorted(nodes))
+    out.append(f"Total edges: {len(edges)}")
+    out.extend(f" {src} -> {dst}" for src, dst in sorted(edges))
     if cycles:
-        print(f"Detected {len(cycles)} cycles:")
-        for cycle in cycles:
-            print(" -> ".join(cycle))
+        out.append(f"Detected {len(cycles)} cycles:")
+        out.extend(" -> ".join(cycle) for cycle in cycles)
     else:
-        print("No cycles detected.")
+        out.append("No cycles detected.")
+    sys.stdout.write("\n".join(out) + "\n")
 
-def find_reverse_dependencies(target: str, edges: Set[Tuple[str, str]], extra_nodes: Set[str] | None = None) -> Set[str]:
-    reverse_graph: Dict[str, Set[str]] = {}
+def find_reverse_dependencies(target: str, edges: Iterable[Tuple[str, str]]) -> Set[str]:
+    reverse_graph: Dict[str, Set[str]] = defaultdict(set)
     for a, b in edges:
-        reverse_graph.setdefault(b, set()).add(a)
-        reverse_graph.setdefault(a, set())
-    if extra_nodes:
-        for n in extra_nodes:
-            reverse_graph.setdefault(n, set())
+        reverse_graph[b].add(a)
     visited: Set[str] = set()
-    def dfs(u: str):
-        for v in sorted(reverse_graph.get(u, set())):
-            if v in visited:
-                continue
-            visited.add(v)
-            dfs(v)
-    dfs(target)
-    visited.discard(target)
+    queue = deque([target])
+    while queue:
+        u = queue.popleft()
+        for v in reverse_graph.get(u, ()):
+            if v not in visited and v != target:
+                visited.add(v)
+                queue.append(v)
     return visited
 
+@functools.lru_cache(maxsize=1)
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Dependency graph visualizer")
     p.add_argument("-p", "--package-name", required=True, type=validate_package_name, help="Name of the package to analyze (required)")
     p.add_argument("-r", "--repo", required=False, type=validate_repo, help="Repository URL or path to test repository (optional when --test-file is used)")
     p.add_argument("--test-file", required=False, type=str, help="Path to test graph file (optional)")
-    p.add_argument("-m", "--repo-mode", default="auto", type=validate_repo_mode, help=f"Mode of working with test repo. One of: {', '.join(sorted(REPO_MODES))}. Default: auto")
+    p.add_argument("-m", "--repo-mode", default="auto", type=validate_repo_mode, help=f"Mode of working with test repo. One of: {_REPO_MODES_HELP}. Default: auto")
     p.add_argument("-v", "--version", default="latest", type=validate_version, help="Package version to analyze (semver or 'latest'). Default: latest")
     p.add_argument("-o", "--output", default="dep_graph.png", type=validate_output, help="Generated image filename (.png, .svg). Default: dep_graph.png")
-    p.add_argument("-f", "--filter", default="", type=validate_filter, help="Substring to filter packages by name (optional)")
+    p.add_argument("-f", "--filter", default="", help="Substring to filter packages by name (optional)")
     p.add_argument("--reverse", dest="reverse_target", required=False, type = str, help = "Show reverse dependencies for the specified package")
     p.add_argument("--verbose", action="store_true", help="Verbose mode (prints extra diagnostics)")
     return p
 
 
-def generate_dot(nodes: Set[str], edges: Set[Tuple[str, str]], start: str) -> str:
-    lines = []
-    lines.append("digraph G {")
-    lines.append('  node [shape=box, style=filled, color=lightgrey];')
+def generate_dot(nodes: Set[str], edges: List[Tuple[str, str]], start: str) -> str:
+    # рёбра уже идут в детерминированном порядке обхода, сортировка не нужна
+    buf = ["digraph G {\n", '  node [shape=box, style=filled, color=lightgrey];\n']
     if start in nodes:
-        lines.append(f'  "{start}" [color=lightblue, style=filled];')
+        buf.append('  "' + start + '" [color=lightblue, style=filled];\n')
     for n in sorted(nodes):
         if n == start:
             continue
-        lines.append(f'  "{n}";')
-    for src, dst in sorted(edges):
-        lines.append(f'  "{src}" -> "{dst}";')
-    lines.append("}")
-    return "\n".join(lines)
+        buf.append('  "' + n + '";\n')
+    for src, dst in edges:
+        buf.append('  "' + src + '" -> "' + dst + '";\n')
+    buf.append("}\n")
+    return "".join(buf)
+
+def _write_dot_file(dot_text: str, dot_path: str) -> None:
+    out_dir = os.path.dirname(os.path.abspath(dot_path)) or "."
+    with tempfile.NamedTemporaryFile(mode="w", encoding="utf-8", dir=out_dir, delete=False, suffix=".dot", prefix="tmp_") as tf:
+        tf.write(dot_text)
+        tf.flush()
+        temp_name = tf.name
+
+    try:
+        os.replace(temp_name, dot_path)
+    except Exception:
+        try:
+            os.remove(dot_path)
+        except Exception:
+            pass
+        os.replace(temp_name, dot_path)
+
 
 def render_svg(dot_text: str, svg_path: str) -> None:
     base = os.path.splitext(svg_path)[0]
     dot_path = base + ".tmp.dot"
-    out_dir = os.path.dirname(os.path.abspath(dot_path)) or "."
+    out_dir = os.path.dirname(os.path.abspath(svg_path)) or "."
 
     os.makedirs(out_dir, exist_ok=True)
 
     try:
-        with tempfile.NamedTemporaryFile(mode="w", encoding="utf-8", dir=out_dir, delete=False, suffix=".dot", prefix="tmp_") as tf:
-            tf.write(dot_text)
-            tf.flush()
-            temp_name = tf.name
-
-        try:
-            os.replace(temp_name, dot_path)
-        except Exception:
-            try:
-                os.remove(dot_path)
-            except Exception:
-                pass
-            os.replace(temp_name, dot_path)
-
-        try:
-            subprocess.run(["dot", "-Tsvg", dot_path, "-o", svg_path], check=True)
-            try:
-                os.remove(dot_path)
-            except Exception:
-                pass
-            print(f"SVG graph generated at: {svg_path}")
-        except FileNotFoundError:
-            print(f"Graphviz 'dot' not found, try downloading at https://graphviz.org/download/; DOT file saved at: {dot_path}")
-        except subprocess.CalledProcessError as e:
-            print(f"Failed to render SVG with dot: {e}", file=sys.stderr)
-            print(f"DOT file is available at: {dot_path}")
+        result = subprocess.run(["dot", "-Tsvg", "-o", svg_path], input=dot_text.encode("utf-8"), check=True, stderr=subprocess.PIPE)
+        if result.stderr:
+            # предупреждения Graphviz при успешном рендере не теряем
+            sys.stderr.write(result.stderr.decode("utf-8", errors="replace"))
+        print(f"SVG graph generated at: {svg_path}")
+        return
+    except FileNotFoundError:
+        message = f"Graphviz 'dot' not found, try downloading at https://graphviz.org/download/; DOT file saved at: {dot_path}"
+    except subprocess.CalledProcessError as e:
+        details = e.stderr.decode("utf-8", errors="replace").strip() if e.stderr else ""
+        print(f"Failed to render SVG with dot: {e}" + (f"\n{details}" if details else ""), file=sys.stderr)
+        message = f"DOT file is available at: {dot_path}"
+    except OSError as e:
+        # dot есть, но не запускается (нет прав на исполнение и т.п.)
+        print(f"Failed to run dot: {e}", file=sys.stderr)
+        message = f"DOT file is available at: {dot_path}"
+
+    # dot недоступен или упал — сохраняем DOT для ручного просмотра
+    try:
+        _write_dot_file(dot_text, dot_path)
+        print(message)
     except Exception as e:
         print(f"Failed to write DOT file: {e}", file=sys.stderr)
 
@@ -462,9 +540,8 @@ def main(argv: list[str] | None = None) -> int:
     argv = argv if argv is not None else sys.argv[1:]
     parser = build_parser()
     args = parser.parse_args(argv)
-    print("Received parameters:")
-    for k, v in sorted(vars(args).items()):
-        print(f"{k}: {v}")
+    items = sorted(vars(args).items())
+    sys.stdout.write("Received parameters:\n" + "\n".join(f"{k}: {v}" for k, v in items) + "\n")
     if not args.test_file and not args.repo:
         error("Either --repo or --test-file must be specified")
     repo_path = None
@@ -474,17 +551,8 @@ def main(argv: list[str] | None = None) -> int:
         except Exception as e:
             error(f"Failed to load test graph: {e}")
         start = args.package_name
-        edges_all: Set[Tuple[str, str]] = set()
-        nodes_all: Set[str] = set()
-        for u, vs in test_graph.items():
-            if args.filter and args.filter in u:
-                continue
-            nodes_all.add(u)
-            for v in vs:
-                if args.filter and args.filter in v:
-                    continue
-                nodes_all.add(v)
-                edges_all.add((u, v))
+        test_graph = filter_graph(test_graph, args.filter)
+        edges_all: Set[Tuple[str, str]] = {(u, v) for u, vs in test_graph.items() for v in vs}
         nodes, edges, cycles = build_graph_from_test(start, test_graph, args.filter)
     print_graph_result(start, nodes, edges, cycles, args.filter)
 
@@ -494,15 +562,14 @@ def main(argv: list[str] | None = None) -> int:
 
     if args.reverse_target:
         source_edges = edges_all if args.test_file else edges
-        reverse_set = find_reverse_dependencies(args.reverse_target, source_edges, extra_nodes=(nodes_all if args.test_file else None))
-        print()
-        print(f"Packages depending on '{args.reverse_target}':")
+        reverse_set = find_reverse_dependencies(args.reverse_target, source_edges)
+        out = ["", f"Packages depending on '{args.reverse_target}':"]
         if reverse_set:
-            for n in sorted(reverse_set):
-                print(f" - {n}")
+            out.extend(f" - {n}" for n in sorted(reverse_set))
         else:
-            print(" None")
-    if repo_path:
+            out.append(" None")
+        sys.stdout.write("\n".join(out) + "\n")
+    if repo_path and repo_path != os.path.abspath(args.repo):
         try:
             shutil.rmtree(repo_path, ignore_errors=True)
         except Exception: